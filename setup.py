@@ -61,15 +61,17 @@ class Test(Command):
 
 def include_dirs():
     ans = []
-    if 'UNRAR_INCLUDE' in os.environ:
-        ans.extend(os.environ['UNRAR_INCLUDE'].split(os.pathsep))
+    for var in ('UNRAR_INCLUDE', 'ZLIB_INCLUDE'):
+        if var in os.environ:
+            ans.extend(os.environ[var].split(os.pathsep))
     return ans
 
 
 def library_dirs():
     ans = []
-    if 'UNRAR_LIBDIRS' in os.environ:
-        ans.extend(os.environ['UNRAR_LIBDIRS'].split(os.pathsep))
+    for var in ('UNRAR_LIBDIRS', 'ZLIB_LIBDIRS'):
+        if var in os.environ:
+            ans.extend(os.environ[var].split(os.pathsep))
     return ans
 
 
@@ -89,7 +91,7 @@ setup(
         Extension(
             str('unrardll.unrar'),
             include_dirs=include_dirs(),
-            libraries=['unrar'],
+            libraries=['unrar', 'zlib' if iswindows else 'z'],
             library_dirs=library_dirs(),
             define_macros=macros(),
             sources=[str('src/unrardll/wrapper.cpp')]
@@ -7,8 +7,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import errno
 import os
 import sys
-from binascii import crc32
-from collections import namedtuple, defaultdict
+from collections import namedtuple
 from contextlib import contextmanager
 
 from . import unrar
@@ -20,6 +19,7 @@ version = V(*map(int, str_version.split('.')))
 RARDLL_VERSION = unrar.RARDllVersion
 iswindows = hasattr(sys, 'getwindowsversion')
 isosx = 'darwin' in sys.platform.lower()
+sep_is_slash = os.sep == '/'
 
 if iswindows:
     long_path_prefix = '\\\\?\\'
@@ -33,44 +33,8 @@ else:
         return path
 
 # local_open() opens a file that wont be inherited by child processes  {{{
-if sys.version_info.major < 3:
-    if iswindows:
-        def local_open(name, mode='r', bufsize=-1):
-            mode += 'N'
-            return open(name, mode, bufsize)
-    elif isosx:
-        import fcntl
-        FIOCLEX = 0x20006601
-
-        def local_open(name, mode='r', bufsize=-1):
-            ans = open(name, mode, bufsize)
-            try:
-                fcntl.ioctl(ans.fileno(), FIOCLEX)
-            except EnvironmentError:
-                fcntl.fcntl(ans, fcntl.F_SETFD, fcntl.fcntl(ans, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
-            return ans
-    else:
-        import fcntl
-        try:
-            cloexec_flag = fcntl.FD_CLOEXEC
-        except AttributeError:
-            cloexec_flag = 1
-        supports_mode_e = False
-
-        def local_open(name, mode='r', bufsize=-1):
-            global supports_mode_e
-            mode += 'e'
-            ans = open(name, mode, bufsize)
-            if supports_mode_e:
-                return ans
-            old = fcntl.fcntl(ans, fcntl.F_GETFD)
-            if not (old & cloexec_flag):
-                fcntl.fcntl(ans, fcntl.F_SETFD, old | cloexec_flag)
-            else:
-                supports_mode_e = True
-            return ans
-else:
-    local_open = open
+# python 3 opens files non-inheritable by default (PEP 446)
+local_open = open
 # }}}
 
 
@@ -95,13 +59,15 @@ class Callback(object):
         self.password_requested = False
 
 
-def safe_path(base, relpath):
-    base = os.path.abspath(base)
+def safe_path(base, relpath, nbase=None):
+    # nbase is the normcased base, when it is specified, base must already
+    # be an absolute path
+    if nbase is None:
+        base = os.path.abspath(base)
+        nbase = os.path.normcase(base)
     path = os.path.abspath(os.path.join(base, relpath))
-    if (
-        os.path.normcase(path) == os.path.normcase(base) or
-        not os.path.normcase(path).startswith(os.path.normcase(base))
-    ):
+    npath = os.path.normcase(path)
+    if npath == nbase or not npath.startswith(nbase):
         return None
     return path
 
@@ -160,9 +126,11 @@ def open_archive(archive_path, callback, mode=unrar.RAR_OM_LIST, get_comment=Fal
         m = e.args[0]
         raise OSError((errno.ENOENT, 'Failed to open archive at: %r with underlying unrar error code: %s' % (
             archive_path, m), archive_path))
-    yield (f, c) if get_comment else f
-    unrar.close_archive(f)
-    del f
+    try:
+        yield (f, c) if get_comment else f
+    finally:
+        unrar.close_archive(f)
+        del f
 
 
 def headers(archive_path, password=None, mode=unrar.RAR_OM_LIST):
@@ -181,9 +149,12 @@ def headers(archive_path, password=None, mode=unrar.RAR_OM_LIST):
 
 def names(archive_path, only_useful=False, password=None):
     ''' Yield the archive file names for all files in the archive '''
-    for h in headers(archive_path, password=password):
-        if not only_useful or is_useful(h):
-            yield h['filename'].replace(os.sep, '/')
+    c = Callback(pw=password)
+    archive_path = type('')(archive_path)
+    with open_archive(archive_path, c) as f:
+        ans = do_func(unrar.read_names, archive_path, f, c, only_useful)
+    for n in ans:
+        yield n if sep_is_slash else n.replace(os.sep, '/')
 
 
 def comment(archive_path):
@@ -207,8 +178,6 @@ class ExtractCallback(Callback):
     def _process_data(self, data):
         self.write(data)
         self.written += len(data)
-        if self.verify_data:
-            self.crc = crc32(data, self.crc) & 0xffffffff
         return True
 
     def reset(self, write=None, crc=0):
@@ -218,26 +187,49 @@ class ExtractCallback(Callback):
         self.crc = crc
 
 
+def process_data(archive_path, f, c, output_fd=-1):
+    # The CRC of the data is computed in the extension module, without
+    # round-tripping through python for every chunk
+    crc = c.crc if c.verify_data else None
+    do_func(unrar.process_file, archive_path, f, c, unrar.RAR_TEST, output_fd, crc)
+    if crc is not None:
+        c.crc = unrar.get_crc(f)
+
+
+def process_data_to_bytes(archive_path, f, c, size):
+    crc = c.crc if c.verify_data else None
+    ans = do_func(unrar.process_file_to_bytes, archive_path, f, c, min(size, sys.maxsize), crc)
+    if crc is not None:
+        c.crc = unrar.get_crc(f)
+    return ans
+
+
 class FileCorrupt(ValueError):
     pass
 
 
+def check_crc(filename, nominal, got):
+    got &= 0xffffffff
+    nominal &= 0xffffffff
+    if nominal != got:
+        raise FileCorrupt('The CRC for %r does not match. Expected: %d Got %d' % (
+            filename, nominal, got))
+
+
 def verify(archive_path, crc_map, password=None):
     # Verify CRCs
     crcs = {}
     for h in headers(archive_path, password=password, mode=unrar.RAR_OM_LIST_INCSPLIT):
         crcs[h['filename']] = h['file_crc']
     for k in crc_map:
-        got = crc_map[k] & 0xffffffff
-        nominal = crcs.get(k, 0) & 0xffffffff
-        if nominal != got:
-            raise FileCorrupt('The CRC for %r does not match. Expected: %d Got %d' % (
-                k, nominal, got))
+        check_crc(k, crcs.get(k, 0), crc_map[k])
 
 
 def _extract(f, archive_path, c, location):
     seen = set()
-    crc_map = defaultdict(lambda: 0)
+    crc_map = {}
+    abs_base = os.path.abspath(location)
+    nbase = os.path.normcase(abs_base)
     while True:
         h = do_func(unrar.read_next_header, archive_path, f, c)
         if h is None:
@@ -246,17 +238,17 @@ def _extract(f, archive_path, c, location):
         if not filename:
             continue
         open_file = None
-        dest = safe_path(location, filename)
-        c.reset(crc=crc_map[filename])
+        dest = safe_path(abs_base, filename, nbase)
+        c.reset(crc=crc_map.get(filename, 0))
         extracted = False
         if h['is_dir']:
             try:
-                os.makedirs(safe_path(location, filename))
+                os.makedirs(dest)
             except Exception:
                 pass
                 # We ignore create directory errors since we dont
                 # care about missing empty dirs
-            crc_map.pop(filename)
+            crc_map.pop(filename, None)
         elif h['redir_type'] != 0:
             if h['redir_type'] == 1:  # Unix symlink
                 syn = h.get('redir_name')
@@ -266,17 +258,16 @@ def _extract(f, archive_path, c, location):
                     if is_safe_symlink(location, os.path.join(syn_base, syn)):
                         ensure_dir(syn_base)
                         os.symlink(syn, dest)
-            crc_map.pop(filename)
+            crc_map.pop(filename, None)
         else:
             ensure_dir(os.path.dirname(dest))
-            open_file = local_open(make_long_path_useable(dest), 'ab' if dest in seen else 'wb')
-            c.reset(write=open_file.write, crc=crc_map[filename])
+            # Data is written directly to the file descriptor by the
+            # extension module, so no python level buffer is needed
+            open_file = local_open(make_long_path_useable(dest), 'ab' if dest in seen else 'wb', 0)
+            c.reset(write=open_file.write, crc=crc_map.get(filename, 0))
             extracted = True
         try:
-            if open_file is not None and not c.verify_data:
-                do_func(unrar.process_file, archive_path, f, c, unrar.RAR_TEST, open_file.fileno())
-            else:
-                do_func(unrar.process_file, archive_path, f, c)
+            process_data(archive_path, f, c, -1 if open_file is None else open_file.fileno())
         finally:
             if open_file is not None:
                 open_file.close()
@@ -285,6 +276,10 @@ def _extract(f, archive_path, c, location):
             crc_map[filename] = c.crc
             c.reset()  # so that file is closed
             os.utime(dest, (h['file_time'], h['file_time']))
+            if c.verify_data and not h['flags'] & unrar.RHDF_SPLITAFTER:
+                # The header of the last part of a file has the CRC of the
+                # whole file, so it can be checked right away
+                check_crc(filename, h['file_crc'], crc_map.pop(filename))
     return crc_map
 
 
@@ -295,7 +290,8 @@ def extract(archive_path, location='.', password=None, verify_data=False):
     with open_archive(archive_path, c, unrar.RAR_OM_EXTRACT) as f:
         crc_map = _extract(f, archive_path, c, location)
     del f
-    if verify_data:
+    if verify_data and crc_map:
+        # Only files whose final CRC was not seen during extraction
         verify(archive_path, crc_map, password=password)
 
 
@@ -311,15 +307,16 @@ def extract_member(archive_path, predicate, password=None, verify_data=False):
             if h['is_dir'] or h['redir_type'] or not predicate(h):
                 do_func(unrar.process_file, archive_path, f, c, unrar.RAR_SKIP)
             else:
-                buf = []
-                c.reset(write=buf.append)
-                do_func(unrar.process_file, archive_path, f, c)
+                c.reset()
+                data = process_data_to_bytes(archive_path, f, c, h['unpack_size'])
                 break
     del f
-    crc_map = {h['filename']: c.crc}
     if verify_data:
-        verify(archive_path, crc_map, password=password)
-    return h['filename'], b''.join(buf)
+        if h['flags'] & unrar.RHDF_SPLITAFTER:
+            verify(archive_path, {h['filename']: c.crc}, password=password)
+        else:
+            check_crc(h['filename'], h['file_crc'], c.crc)
+    return h['filename'], data
 
 
 def extract_members(archive_path, callback, password=None, verify_data=False):
@@ -338,6 +335,6 @@ def extract_members(archive_path, callback, password=None, verify_data=False):
                 do_func(unrar.process_file, archive_path, f, c, unrar.RAR_SKIP)
             else:
                 c.reset(write=callback)
-                do_func(unrar.process_file, archive_path, f, c)
+                process_data(archive_path, f, c)
                 if verify_data:
                     callback(c.crc & 0xffffffff == h['file_crc'] & 0xffffffff)
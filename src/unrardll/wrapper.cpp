@@ -18,6 +18,7 @@
 #endif
 #include <unrar/dll.hpp>
 #include <errno.h>
+#include <zlib.h>
 
 #define CALLBACK_ERROR_SZ 256
 typedef struct {
@@ -27,6 +28,11 @@ typedef struct {
     bool has_callback_error;
     char callback_error[CALLBACK_ERROR_SZ + 1];
     int output_fd;
+    bool compute_crc;
+    uLong crc;
+    bool to_bytes;
+    PyObject *output_bytes;
+    Py_ssize_t output_pos;
 } UnrarOperation;
 
 #define ALLOW_THREADS uo->thread_state = PyGILState_Ensure();
@@ -147,6 +153,22 @@ write_all(const char* data, size_t sz, int fd) {
     return true;
 }
 
+static inline bool
+append_to_bytes(UnrarOperation *uo, const char* data, size_t sz) {
+    if (uo->output_bytes == NULL) return false;
+    Py_ssize_t needed = uo->output_pos + sz, existing = PyBytes_GET_SIZE(uo->output_bytes);
+    if (needed > existing) {
+        BLOCK_THREADS;
+        int ret = _PyBytes_Resize(&uo->output_bytes, needed > 2 * existing ? needed : 2 * existing);
+        PyErr_Clear();
+        ALLOW_THREADS;
+        if (ret != 0) return false;
+    }
+    memcpy(PyBytes_AS_STRING(uo->output_bytes) + uo->output_pos, data, sz);
+    uo->output_pos = needed;
+    return true;
+}
+
 static int CALLBACK
 unrar_callback(UINT msg, LPARAM user_data, LPARAM p1, LPARAM p2) {
     int ret = -1;
@@ -202,7 +224,13 @@ unrar_callback(UINT msg, LPARAM user_data, LPARAM p1, LPARAM p2) {
                 uo->has_callback_error = true;
                 break;
             }
-            if (callback) {
+            if (uo->compute_crc) uo->crc = crc32(uo->crc, reinterpret_cast<const Bytef*>(p1), length);
+            if (uo->to_bytes) {
+                if (!append_to_bytes(uo, reinterpret_cast<const char*>(p1), length)) {
+                    snprintf(uo->callback_error, CALLBACK_ERROR_SZ, "Failed to allocate memory for the extracted data");
+                    uo->has_callback_error = true;
+                } else ret = 0;
+            } else if (callback) {
                 if (uo->output_fd > -1) {
                     if (!write_all(reinterpret_cast<const char*>(p1), length, uo->output_fd)) {
                         snprintf(uo->callback_error, CALLBACK_ERROR_SZ, "Failed to write all bytes to output file. Error: %s", strerror(errno));
@@ -371,11 +399,16 @@ read_next_header(PyObject *self, PyObject *file_capsule) {
 static PyObject*
 process_file(PyObject *self, PyObject *args) {
     int operation = RAR_TEST, output_fd = -1;
-    PyObject *file_capsule;
+    PyObject *file_capsule, *crc = Py_None;
 
-    if (!PyArg_ParseTuple(args, "O|ii", &file_capsule, &operation, &output_fd)) return NULL;
+    if (!PyArg_ParseTuple(args, "O|iiO", &file_capsule, &operation, &output_fd, &crc)) return NULL;
     UnrarOperation *uo = FROM_CAPSULE(file_capsule);
     uo->output_fd = output_fd;
+    uo->compute_crc = crc != Py_None;
+    if (uo->compute_crc) {
+        uo->crc = PyLong_AsUnsignedLongMask(crc) & 0xffffffff;
+        if (PyErr_Occurred()) return NULL;
+    }
     HANDLE data = uo->unrar_data;
     ALLOW_THREADS;
     unsigned int retval = RARProcessFile(data, operation, NULL, NULL);
@@ -387,6 +420,103 @@ process_file(PyObject *self, PyObject *args) {
     return NULL;
 }
 
+#define MAX_INITIAL_OUTPUT_SIZE (64 * 1024 * 1024)
+
+static PyObject*
+process_file_to_bytes(PyObject *self, PyObject *args) {
+    Py_ssize_t size = 0;
+    PyObject *file_capsule, *crc = Py_None, *ans;
+
+    if (!PyArg_ParseTuple(args, "On|O", &file_capsule, &size, &crc)) return NULL;
+    UnrarOperation *uo = FROM_CAPSULE(file_capsule);
+    uo->output_fd = -1;
+    uo->compute_crc = crc != Py_None;
+    if (uo->compute_crc) {
+        uo->crc = PyLong_AsUnsignedLongMask(crc) & 0xffffffff;
+        if (PyErr_Occurred()) return NULL;
+    }
+    // The size in the header is only a hint and comes from the untrusted
+    // archive, so cap the up front allocation and let the buffer grow as data
+    // arrives
+    if (size < 0) size = 0;
+    if (size > MAX_INITIAL_OUTPUT_SIZE) size = MAX_INITIAL_OUTPUT_SIZE;
+    uo->output_bytes = PyBytes_FromStringAndSize(NULL, size);
+    if (uo->output_bytes == NULL) {
+        PyErr_Clear();
+        uo->output_bytes = PyBytes_FromStringAndSize(NULL, 64 * 1024);
+        if (uo->output_bytes == NULL) return NULL;
+    }
+    uo->output_pos = 0;
+    uo->to_bytes = true;
+    HANDLE data = uo->unrar_data;
+    ALLOW_THREADS;
+    unsigned int retval = RARProcessFile(data, RAR_TEST, NULL, NULL);
+    BLOCK_THREADS;
+    uo->to_bytes = false;
+    ans = uo->output_bytes; uo->output_bytes = NULL;
+    if (retval == ERAR_SUCCESS && ans != NULL) {
+        if (uo->output_pos != PyBytes_GET_SIZE(ans) && _PyBytes_Resize(&ans, uo->output_pos) != 0) return NULL;
+        return ans;
+    }
+    Py_XDECREF(ans);
+    if (retval == ERAR_UNKNOWN && uo->has_callback_error) {
+        PyErr_SetString(UNRARError, uo->callback_error);
+    } else if (retval == ERAR_SUCCESS) {
+        NOMEM;
+    } else convert_rar_error(retval);
+    return NULL;
+}
+
+static PyObject*
+get_crc(PyObject *self, PyObject *file_capsule) {
+    UnrarOperation *uo = FROM_CAPSULE(file_capsule);
+    return PyLong_FromUnsignedLong(uo->crc & 0xffffffff);
+}
+
+static PyObject*
+read_names(PyObject *self, PyObject *args) {
+    PyObject *file_capsule, *only_useful = Py_False, *ans = NULL, *name;
+    RARHeaderDataEx header;
+    unsigned int retval;
+
+    if (!PyArg_ParseTuple(args, "O|O", &file_capsule, &only_useful)) return NULL;
+    UnrarOperation *uo = FROM_CAPSULE(file_capsule);
+    int useful = PyObject_IsTrue(only_useful);
+    if (useful < 0) return NULL;
+    ans = PyList_New(0);
+    if (ans == NULL) return NULL;
+    uo->output_fd = -1;
+    uo->compute_crc = false;
+    while (true) {
+        memset(&header, 0, sizeof(header));
+        ALLOW_THREADS;
+        retval = RARReadHeaderEx(uo->unrar_data, &header);
+        BLOCK_THREADS;
+        if (retval == ERAR_END_ARCHIVE) break;
+        if (retval != ERAR_SUCCESS) { convert_rar_error(retval); goto error; }
+        if (!useful || !(header.Flags & RHDF_DIRECTORY || header.RedirType)) {
+            name = wchar_to_unicode(header.FileNameW, wcslen(header.FileNameW));
+            if (name == NULL) goto error;
+            int ret = PyList_Append(ans, name);
+            Py_DECREF(name);
+            if (ret != 0) goto error;
+        }
+        ALLOW_THREADS;
+        retval = RARProcessFile(uo->unrar_data, RAR_SKIP, NULL, NULL);
+        BLOCK_THREADS;
+        if (retval != ERAR_SUCCESS) {
+            if (retval == ERAR_UNKNOWN && uo->has_callback_error) {
+                PyErr_SetString(UNRARError, uo->callback_error);
+            } else convert_rar_error(retval);
+            goto error;
+        }
+    }
+    return ans;
+error:
+    Py_DECREF(ans);
+    return NULL;
+}
+
 
 // Boilerplate {{{
 struct module_state {
@@ -416,7 +546,21 @@ static PyMethodDef methods[] = {
     },
 
     {"process_file", (PyCFunction)process_file, METH_VARARGS,
-        "process_file(capsule, operation=RAR_TEST)\n\nProcess the current file. The callback registered in open_archive will be called."
+        "process_file(capsule, operation=RAR_TEST, output_fd=-1, crc=None)\n\nProcess the current file. The callback registered in open_archive will be called."
+        " If crc is not None, the CRC32 of the processed data is accumulated starting from it, use get_crc() to read it."
+    },
+
+    {"process_file_to_bytes", (PyCFunction)process_file_to_bytes, METH_VARARGS,
+        "process_file_to_bytes(capsule, size, crc=None)\n\nExtract the current file and return its data as bytes. size is the expected size of the data,"
+        " used to allocate the result up front. crc is as for process_file()."
+    },
+
+    {"get_crc", (PyCFunction)get_crc, METH_O,
+        "get_crc(capsule)\n\nReturn the CRC32 accumulated by the last call to process_file() or process_file_to_bytes()"
+    },
+
+    {"read_names", (PyCFunction)read_names, METH_VARARGS,
+        "read_names(capsule, only_useful=False)\n\nReturn a list of the names of all remaining files in the archive. If only_useful is True, directories and links are skipped."
     },
 
     {NULL, NULL}
@@ -484,6 +628,7 @@ initunrar(void)
     if (PyModule_AddIntMacro(module, RAR_SKIP) != 0) { INITERROR; }
     if (PyModule_AddIntMacro(module, RAR_EXTRACT) != 0) { INITERROR; }
     if (PyModule_AddIntMacro(module, RAR_TEST) != 0) { INITERROR; }
+    if (PyModule_AddIntMacro(module, RHDF_SPLITAFTER) != 0) { INITERROR; }
 
 #if PY_MAJOR_VERSION >= 3
     return module;
@@ -8,10 +8,12 @@ import hashlib
 import os
 import unicodedata
 import unittest
-from binascii import crc32
+from pathlib import Path
+from unittest.mock import patch
+from zlib import crc32
 
 from unrardll import (
-    BadPassword, PasswordRequired, comment, extract, extract_member, extract_members, headers, names,
+    BadPassword, Callback, FileCorrupt, PasswordRequired, comment, extract, extract_member, extract_members, headers, names,
     open_archive, unrar, make_long_path_useable
 )
 
@@ -42,6 +44,15 @@ def normalize(x):
     return unicodedata.normalize('NFC', x)
 
 
+def walk_scandir(path):
+    'Recursively yield the DirEntry objects for everything that is not a directory under path, without following symlinks'
+    for e in os.scandir(path):
+        if e.is_dir(follow_symlinks=False):
+            yield from walk_scandir(e.path)
+        else:
+            yield e
+
+
 def get_memory():
     'Return memory usage in bytes'
     # See https://pythonhosted.org/psutil/#psutil.Process.memory_info
@@ -88,14 +99,13 @@ class BasicTests(TestCase):
                     normalize(os.path.abspath(os.path.join(tdir, h['filename']))): h
                     for h in headers(simple_rar)}
                 data = {}
-                for dirpath, dirnames, filenames in os.walk(tdir):
-                    for f in filenames:
-                        path = normalize(os.path.join(dirpath, f))
-                        data[os.path.relpath(path, tdir).replace(os.sep, '/')] = d = open(path, 'rb').read()
-                        if f == 'one.txt':
-                            self.ae(os.path.getmtime(path), 1098472879)
-                        self.ae(h[path]['unpack_size'], len(d))
-                        self.ae(h[path]['file_crc'] & 0xffffffff, crc32(d) & 0xffffffff)
+                for e in walk_scandir(tdir):
+                    path = normalize(e.path)
+                    if e.name == 'one.txt':
+                        self.ae(e.stat().st_mtime, 1098472879)
+                    data[os.path.relpath(path, tdir).replace(os.sep, '/')] = d = Path(e.path).read_bytes()
+                    self.ae(h[path]['unpack_size'], len(d))
+                    self.ae(h[path]['file_crc'] & 0xffffffff, crc32(d) & 0xffffffff)
             q = {k: v for k, v in sr_data.items() if v}
             del q['symlink']
             self.ae(data, q)
@@ -132,6 +142,31 @@ class BasicTests(TestCase):
         self.ae(extract_member(simple_rar, lambda h: h['filename'] == 'one.txt', verify_data=True), ('one.txt', sr_data['one.txt']))
         self.ae(extract_member(simple_rar, lambda h: False), (None, None))
 
+    def test_verify_failure(self):
+        def bad_crc(f):
+            return 0xdeadbeef
+
+        with patch.object(unrar, 'get_crc', bad_crc):
+            for archive in (simple_rar, multipart_rar):
+                with TempDir() as tdir:
+                    self.assertRaises(FileCorrupt, extract, archive, tdir, verify_data=True)
+            self.assertRaises(FileCorrupt, extract_member, simple_rar, lambda h: h['filename'] == 'one.txt', verify_data=True)
+
+    def test_process_file_to_bytes(self):
+        # Check both growing the buffer when the size is too small and
+        # trimming it when the size is too large
+        for size in (1, 1 << 20):
+            with open_archive(simple_rar, Callback(), mode=unrar.RAR_OM_EXTRACT) as f:
+                while True:
+                    h = unrar.read_next_header(f)
+                    if h['filename'] == 'uncompressed':
+                        break
+                    unrar.process_file(f, unrar.RAR_SKIP)
+                data = unrar.process_file_to_bytes(f, size, 0)
+                self.ae(data, sr_data['uncompressed'])
+                self.ae(unrar.get_crc(f), h['file_crc'] & 0xffffffff)
+                self.ae(crc32(data) & 0xffffffff, h['file_crc'] & 0xffffffff)
+
     def test_extract_members(self):
         data = {'one.txt': b'', 'uncompressed': b''}
         current = ''